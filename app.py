@@ -1,6 +1,8 @@
 # app.py
 import streamlit as st
+import atexit
 import os
+import threading
 import time
 import tempfile
 from pathlib import Path
@@ -10,44 +12,12 @@ import os
 from datetime import datetime
 
 # ====== 导入你的真实模块(请根据实际路径调整)======
-from utils import (
-    extract_frames,
-    run_ocr,
-    denoise_ocr,
-    merge_text_across_frames_for_understanding,
-    build_timeline,
-    build_prompt
-)
+from utils import OCREngines
 from llm_client import LLMClient
+from feature_writer import FeatureWriter
+from pipeline import default_prompt, get_analysis_mode_config, analyze_video
 
 
-
-default_prompt = """你是一个专业的短视频内容理解与审核模型。
-你将基于视频中通过 OCR 提取的文字内容，对视频进行多维度分析。
-
-【背景说明】
-- 以下文字按时间顺序提取自视频画面（包括字幕、标题、水印等）。
-- 若某文本在连续时间段重复出现，通常表示其为核心信息或固定标识。
-- 文本可能包含口语化表达、营销话术或不完整句子，请结合整体语境理解。
-
-【视频文字时间轴】
-{timeline_text}
-
-【分析任务】
-请严格按以下各项完成分析，并以 JSON 格式输出，不要任何额外说明：
-
-1. summary: 用一句话概括视频主要内容
-2. summary_confidence:给出摘要的置信度(0-1)
-3. tags: 给出 3~5 个内容标签（字符串列表）
-4. category: 内容类型（如 新闻、体育、娱乐、广告 等）
-5. genre: 内容体裁（如 赛事报道、人物特写、快讯 等）
-6. tone: 整体调性（如 客观、煽情、幽默、严肃 等）
-7. sentiment: 情感倾向（如 积极、消极、中性）
-8. is_low_quality: 是否为低质内容（是/否）若是请描述原因
-9. has_risk: 是否存在潜在违规风险（是/否）若是请描述原因
-
-【输出格式】
-只输出一个合法 JSON 对象，字段名必须为上述英文名。"""
 # ====== 页面配置 ======
 st.set_page_config(
     page_title="🎥 AI 视频理解系统",
@@ -72,37 +42,21 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-def get_analysis_mode_config(mode: str):
+# 结构化输出：Streamlit 每次交互都会重跑脚本，writer 需跨重跑复用；
+# 交互式分析频率低，每次分析后立即落盘，进程被杀也不丢已付费的大模型结果
+@st.cache_resource
+def get_feature_writer():
+    writer = FeatureWriter(output_dir="outputs", fmt="parquet")
+    atexit.register(writer.close)
+    return writer
 
-    MODE_CONFIGS = {
-        "快速摘要": {
-            "sim_threshold": 0.92,      # 高相似才合并,保留关键信息
-            "time_gap_merge": 6,        # 较长间隔,减少片段数量
-            "interval_sec": 5,
 
-        },
-        "全面分析": {
-            "sim_threshold": 0.85,      # 中等相似度,平衡细节与冗余
-            "time_gap_merge": 3,        # 适中合并窗口
-            "interval_sec": 3,
+# OCR 模型跨重跑预热复用；Paddle 推理非线程安全，多个会话同时分析时串行使用
+@st.cache_resource
+def get_ocr_engines():
+    return OCREngines(), threading.Lock()
 
-        },
-        "审核模式": {
-            "sim_threshold": 0.78,      # 更敏感,保留更多原文细节(防漏检)
-            "time_gap_merge": 2,        # 短间隔,避免跨镜头误合
-            "interval_sec": 1,
-        },
-        "自定义": {
-            "sim_threshold": 0.90,      # 默认值,实际由前端传参覆盖(此处仅兜底)
-            "time_gap_merge": 6,
-            "interval_sec": 1,
-        }
-    }
-
-    if mode not in MODE_CONFIGS:
-        raise ValueError(f"不支持的分析模式: {mode}。可选值: {list(MODE_CONFIGS.keys())}")
 
-    return MODE_CONFIGS[mode]
 # ====== 主界面 ======
 st.title("🎥 AI 视频内容理解系统")
 st.caption("支持多模态分析 · 动态 Prompt 配置 · 实时结构化输出")
@@ -153,6 +107,8 @@ with col_left:
             user_sim_threshold = st.slider("文本相似度阈值", 0.7, 1.0, 0.92, 0.01)    
             user_time_gap_merge = st.slider("合并时间间隔(秒)", 3, 10, 6, 1)
             user_interval_sec = st.slider("抽帧间隔", 1, 10, 5, 1)
+            user_det_max_width = st.slider("文本检测宽度(px)", 256, 960, 384, 32,
+                                           help="越小检测越快，过小会漏掉细小字幕")
 
         st.markdown("🧠 大模型选择")
         model_options = {
@@ -197,18 +153,29 @@ with col_right:
         st.subheader("📊 分析结果")
         
         if st.button("🚀 开始分析", type="primary", use_container_width=True):
-            mode_config = get_analysis_mode_config(analysis_mode)
+            mode_config = dict(get_analysis_mode_config(analysis_mode))
             if analysis_mode == "自定义":
-                actual_sim = user_sim_threshold
-                actual_gap = user_time_gap_merge
-                interval_sec = user_interval_sec
-            else:
-                actual_sim = mode_config["sim_threshold"]
-                actual_gap = mode_config["time_gap_merge"]
-                interval_sec = mode_config["interval_sec"]
+                mode_config.update(
+                    sim_threshold=user_sim_threshold,
+                    time_gap_merge=user_time_gap_merge,
+                    interval_sec=user_interval_sec,
+                    det_max_width=user_det_max_width
+                )
             
             status_text = st.empty()
             progress_bar = st.progress(0)
+            stage_progress = {
+                "extract_frames": ("📸 抽帧中...", 30),
+                "probe": ("🔎 探测画面文字密度...", 40),
+                "ocr": ("🔤 OCR 识别中...", 50),
+                "merge": ("🧩 合并文本片段...", 70),
+                "llm": ("🧠 调用大模型生成报告...", 90),
+            }
+
+            def show_progress(stage):
+                text, percent = stage_progress[stage]
+                status_text.text(text)
+                progress_bar.progress(percent)
             
             try:
                 # === 阶段 1: 准备视频 ===
@@ -226,45 +193,46 @@ with col_right:
                         tmp.write(uploaded_file.read())
                         video_path = tmp.name
                 
-                # === 阶段 2: 抽帧 & OCR ===
-                status_text.text("📸 抽帧中...")
-                progress_bar.progress(30)
-                frame_dir = tempfile.mkdtemp()
-                frames = extract_frames(video_path, frame_dir, interval_sec)
-               
-                
-                status_text.text("🔤 OCR 识别中...")
-                progress_bar.progress(50)
-                ocr_raw = run_ocr(frames)
-                ocr_cleaned = denoise_ocr(ocr_raw, conf_threshold=0.75)
-                
-                # === 阶段 3: 合并文本 ===
-                status_text.text("🧩 合并文本片段...")
-                progress_bar.progress(70)
-
-                final_segments = merge_text_across_frames_for_understanding(
-                    ocr_cleaned,
-                    sim_threshold=actual_sim,
-                    time_gap_merge=actual_gap
-                )
-                # === 构造最终 Prompt(关键:使用用户输入的 prompt)===
-
-                timeline_text = build_timeline(final_segments)
-
-                final_prompt = build_prompt(st.session_state.current_prompt,timeline_text=timeline_text)
-
-                
-                # === 阶段 4: 调用 LLM ===
-                status_text.text("🧠 调用大模型生成报告...")
-                progress_bar.progress(90)
+                # === 阶段 2~4: 抽帧 → 探测 → OCR → 合并 → 大模型(使用用户输入的 prompt)===
                 actual_model = selected_model  # ← 用户选择的模型
-
                 llm = LLMClient(
                     api_key=os.getenv('DASHSCOPE_API_KEY'),
                     api_url="https://dashscope.aliyuncs.com/compatible-mode/v1/chat/completions",
                     model_name=actual_model
                 )
-                result = llm.analyze(final_prompt)  # ← 真实调用
+                engines, engines_lock = get_ocr_engines()
+                with engines_lock:
+                    output = analyze_video(
+                        video_path,
+                        mode_config,
+                        st.session_state.current_prompt,
+                        llm,
+                        engines=engines,
+                        frame_dir=tempfile.mkdtemp(),
+                        progress=show_progress
+                    )
+                result = output["result"]
+                final_segments = output["segments"]
+                timeline_text = output["timeline_text"]
+                timings = output["timings"]
+                probe_decision = output["text_probe"]
+                llm_report = output["llm_report"]
+
+                try:
+                    writer = get_feature_writer()
+                    writer.add(
+                        result,
+                        final_segments,
+                        timings,
+                        video_path=video_path,
+                        model=actual_model,
+                        mode=analysis_mode,
+                        probe=probe_decision,
+                        llm_report=llm_report
+                    )
+                    writer.flush()
+                except Exception as e:
+                    logger.error(f"结构化结果写入失败: {e}")
                 # 在你的分析代码中替换日志部分
                 try:
                     # 构造纯字符串日志（安全！）
@@ -273,6 +241,8 @@ with col_right:
                         f"----------------Full Prompt:---------------\n{st.session_state.current_prompt}\n"
                         f"----------------TimelineText:-------------\n{timeline_text}\n"
                         f"Model: {actual_model}\n"
+                        f"Text probe: {json.dumps(probe_decision, ensure_ascii=False)}\n"
+                        f"LLM report: {json.dumps(llm_report, ensure_ascii=False)}\n"
            
                         f"Result preview: {str(result)[:500]}\n"
                         f"{'-'*50}\n"
@@ -293,6 +263,34 @@ with col_right:
                 time.sleep(0.2)
                 status_text.empty()
                 progress_bar.empty()
+
+                # 文字密度探测结论
+                probe_labels = {"full": "全量 OCR", "sparse": "稀疏 OCR", "skip": "跳过 OCR"}
+                probe_msg = (
+                    f"文字密度探测：{probe_labels[probe_decision['action']]}"
+                    f"（含文字帧占比 {probe_decision['text_ratio']:.0%}，"
+                    f"OCR {probe_decision['frames_ocr']}/{probe_decision['frames_total']} 帧，"
+                    f"节省 {probe_decision['frames_saved']} 帧"
+                    f"{'，未调用大模型' if probe_decision['llm_skipped'] else ''}）"
+                )
+                if probe_decision["action"] == "full":
+                    st.caption(probe_msg)
+                else:
+                    st.info(probe_msg)
+
+                # JSON 本地修复 / 重试情况
+                if llm_report:
+                    llm_msg = f"大模型请求 {llm_report['http_calls']} 次"
+                    if llm_report["repairs"]:
+                        llm_msg += f"，本地修复 JSON：{'、'.join(llm_report['repairs'])}"
+                    if llm_report["field_recall"]:
+                        llm_msg += f"，补全字段：{'、'.join(llm_report['field_recall'])}"
+                    if llm_report["full_recalls"]:
+                        llm_msg += f"，整体重试 {llm_report['full_recalls']} 次"
+                    if llm_report["missing_fields"]:
+                        st.warning(f"{llm_msg}；仍缺失字段：{'、'.join(llm_report['missing_fields'])}")
+                    else:
+                        st.caption(llm_msg)
                 
                 # ==============================
                 # 可折叠显示原始 result 内容
@@ -0,0 +1,269 @@
+import argparse
+import glob
+import hashlib
+import json
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time
+import uuid
+
+from llm_client import LLMClient, StubLLMClient
+from pipeline import default_prompt, get_analysis_mode_config, analyze_video
+from feature_writer import FeatureWriter
+from utils import OCREngines, DEFAULT_DET_MODEL
+from work_queue import WorkQueue
+
+
+API_URL = "https://dashscope.aliyuncs.com/compatible-mode/v1/chat/completions"
+VIDEO_EXTS = (".mp4", ".mov", ".mkv", ".avi", ".flv")
+
+
+def collect_videos(paths):
+    """展开目录与通配符，返回视频文件列表"""
+    videos = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                videos.extend(os.path.join(root, f) for f in sorted(files) if f.lower().endswith(VIDEO_EXTS))
+        else:
+            videos.extend(sorted(glob.glob(path)) or [path])
+    return [v for v in videos if os.path.isfile(v)]
+
+
+def task_key(video_path, mode):
+    """
+    任务的稳定标识：由 (video_path, mode) 决定，与队列数据库无关。
+    换一个 queue.db 后任务 id 会从 1 重新开始，结果文件名与 analysis_id 不能用任务 id
+    """
+    digest = hashlib.sha1(f"{video_path}\0{mode}".encode("utf-8")).hexdigest()[:16]
+    return f"task-{digest}"
+
+
+def result_path(output_dir, task):
+    # 同一任务被重复处理（租约过期后重领）也只会覆盖同一文件，不产生重复
+    return os.path.join(output_dir, f"{task_key(task['video_path'], task['mode'])}.json")
+
+
+def write_result(output_dir, task, record):
+    """先写临时文件再原子替换，避免其他节点读到半个文件"""
+    os.makedirs(output_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=output_dir, prefix=".tmp-", suffix=".json")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(record, f, ensure_ascii=False)
+    os.replace(tmp_path, result_path(output_dir, task))
+
+
+def load_existing_result(output_dir, task):
+    """
+    读取该任务已有的结果，文件不存在、不完整或不属于该任务时返回 None。
+    只认同一任务写出的结果（任务 id、视频路径、模式均一致），换队列重跑时会重新分析并覆盖
+    """
+    try:
+        with open(result_path(output_dir, task), encoding="utf-8") as f:
+            record = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if (record.get("task_id"), record.get("video_path"), record.get("mode")) != \
+            (task["id"], task["video_path"], task["mode"]):
+        return None
+    return record
+
+
+class Heartbeat(threading.Thread):
+    """处理任务期间后台定期续租，租约丢失后停止"""
+
+    def __init__(self, db_path, task_id, worker_id, lease_sec):
+        super().__init__(daemon=True)
+        self.db_path = db_path
+        self.task_id = task_id
+        self.worker_id = worker_id
+        self.lease_sec = lease_sec
+        self.interval = max(lease_sec / 3, 0.1)
+        self._stop_event = threading.Event()
+
+    def run(self):
+        # sqlite 连接不能跨线程使用，心跳线程单独连接
+        queue = WorkQueue(self.db_path, lease_sec=self.lease_sec)
+        try:
+            while not self._stop_event.wait(self.interval):
+                if not queue.heartbeat(self.task_id, self.worker_id):
+                    break
+        finally:
+            queue.close()
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def run_worker(args):
+    worker_id = args.worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+    queue = WorkQueue(args.queue, lease_sec=args.lease, max_attempts=args.max_attempts)
+    engines = OCREngines(det_model=args.det_model)  # 每个 worker 进程预热一份，任务间复用
+
+    if args.stub_llm:
+        llm = StubLLMClient(model_name=args.model, delay_sec=args.stub_delay)
+    else:
+        llm = LLMClient(api_key=os.getenv('DASHSCOPE_API_KEY'), api_url=API_URL, model_name=args.model)
+
+    print(f"[{worker_id}] 已启动，队列: {args.queue}")
+    processed = 0
+    while args.max_tasks is None or processed < args.max_tasks:
+        task = queue.claim(worker_id)
+        if task is None:
+            stats = queue.stats()
+            if args.wait or stats["running"] > 0:
+                # 还有其他节点处理中的任务，可能因租约过期回到队列，继续等待
+                time.sleep(args.poll)
+                continue
+            break
+
+        if load_existing_result(args.output, task) is not None:
+            # 上一个持有者已写出结果、但提交前租约过期，直接提交，不重复分析
+            queue.complete(task["id"], worker_id)
+            print(f"[{worker_id}] 任务 {task['id']} 已有结果，直接标记完成")
+            processed += 1
+            continue
+
+        print(f"[{worker_id}] 领取任务 {task['id']}（第 {task['attempts']} 次）: {task['video_path']}")
+        heartbeat = Heartbeat(args.queue, task["id"], worker_id, args.lease)
+        heartbeat.start()
+        start = time.perf_counter()
+        try:
+            with tempfile.TemporaryDirectory() as frame_dir:
+                output = analyze_video(
+                    task["video_path"],
+                    get_analysis_mode_config(task["mode"]),
+                    default_prompt,
+                    llm,
+                    engines=engines,
+                    frame_dir=frame_dir
+                )
+            output.update(
+                task_id=task["id"],
+                video_path=task["video_path"],
+                mode=task["mode"],
+                model=llm.model_name,
+                worker=worker_id,
+                elapsed=round(time.perf_counter() - start, 3),
+                finished_at=time.time()
+            )
+            write_result(args.output, task, output)
+        except Exception as e:
+            heartbeat.stop()
+            queue.fail(task["id"], worker_id, e)
+            print(f"[{worker_id}] 任务 {task['id']} 失败: {e}")
+        else:
+            heartbeat.stop()
+            if queue.complete(task["id"], worker_id):
+                print(f"[{worker_id}] 任务 {task['id']} 完成，耗时 {output['elapsed']:.2f} 秒")
+            else:
+                # 租约已被回收，结果文件与其他节点写的是同一个，不会重复
+                print(f"[{worker_id}] 任务 {task['id']} 完成但租约已失效，由持有者负责提交")
+        processed += 1
+
+    print(f"[{worker_id}] 退出，共处理 {processed} 个任务")
+    queue.close()
+
+
+def run_export(args):
+    """
+    把结果目录汇总为 Parquet/Arrow，analysis_id 为 task_key(video_path, mode)，便于下游去重关联。
+    每次全量重建：先写到同级临时目录再替换 feature_dir，重复导出不会产生重复行
+    """
+    files = sorted(glob.glob(os.path.join(args.output, "task-*.json")))
+    feature_dir = os.path.abspath(args.feature_dir)
+    parent, name = os.path.split(feature_dir)
+    os.makedirs(parent, exist_ok=True)
+    build_dir = tempfile.mkdtemp(dir=parent, prefix=f".{name}-build-")
+    try:
+        _export_files(files, build_dir, args.format)
+    except Exception:
+        shutil.rmtree(build_dir, ignore_errors=True)
+        raise
+
+    if os.path.exists(feature_dir):
+        old_dir = tempfile.mkdtemp(dir=parent, prefix=f".{name}-old-")
+        os.replace(feature_dir, os.path.join(old_dir, name))
+        os.replace(build_dir, feature_dir)
+        shutil.rmtree(old_dir, ignore_errors=True)
+    else:
+        os.replace(build_dir, feature_dir)
+    print(f"已导出 {len(files)} 条结果到 {args.feature_dir}")
+
+
+def _export_files(files, feature_dir, fmt):
+    with FeatureWriter(output_dir=feature_dir, fmt=fmt) as writer:
+        for path in files:
+            with open(path, encoding="utf-8") as f:
+                record = json.load(f)
+            writer.add(
+                record["result"],
+                record["segments"],
+                record["timings"],
+                video_path=record["video_path"],
+                model=record["model"],
+                mode=record["mode"],
+                probe=record["text_probe"],
+                llm_report=record["llm_report"],
+                analysis_id=task_key(record["video_path"], record["mode"])
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多节点批量分析：共享目录下的 SQLite 任务队列")
+    parser.add_argument("--queue", default="work/queue.db", help="队列数据库路径（各节点共享）")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_enqueue = sub.add_parser("enqueue", help="视频入队")
+    p_enqueue.add_argument("paths", nargs="+", help="视频文件、目录或通配符")
+    p_enqueue.add_argument("--mode", default="全面分析", help="分析模式，同 get_analysis_mode_config")
+
+    p_worker = sub.add_parser("worker", help="启动一个 worker 进程")
+    p_worker.add_argument("--output", default="work/results", help="结果目录（各节点共享）")
+    p_worker.add_argument("--model", default="qwen-plus")
+    p_worker.add_argument("--lease", type=float, default=300, help="租约时长（秒），心跳每 1/3 租约续一次")
+    p_worker.add_argument("--max-attempts", type=int, default=3, help="单个任务最多尝试次数")
+    p_worker.add_argument("--poll", type=float, default=5, help="无任务时的轮询间隔（秒）")
+    p_worker.add_argument("--wait", action="store_true", help="队列清空后继续等待新任务")
+    p_worker.add_argument("--max-tasks", type=int, default=None, help="处理指定数量任务后退出")
+    p_worker.add_argument("--worker-id", default=None)
+    p_worker.add_argument("--stub-llm", action="store_true", help="使用假大模型，便于本地测试")
+    p_worker.add_argument("--stub-delay", type=float, default=0.5)
+    p_worker.add_argument("--det-model", default=DEFAULT_DET_MODEL,
+                          help="文本检测模型，PP-OCRv5_mobile_det 更快但小字召回更低")
+
+    sub.add_parser("status", help="查看队列状态")
+
+    p_export = sub.add_parser("export", help="汇总结果为 Parquet/Arrow")
+    p_export.add_argument("--output", default="work/results", help="结果目录")
+    p_export.add_argument("--feature-dir", default="work/features",
+                          help="导出目录，每次导出整体替换，勿与 app/service 的 outputs 共用")
+    p_export.add_argument("--format", default="parquet", choices=["parquet", "arrow"])
+
+    args = parser.parse_args()
+
+    if args.command == "enqueue":
+        get_analysis_mode_config(args.mode)  # 校验模式
+        videos = collect_videos(args.paths)
+        queue = WorkQueue(args.queue)
+        added = queue.enqueue(videos, args.mode)
+        print(f"发现 {len(videos)} 个视频，新增 {added} 个任务")
+        queue.close()
+    elif args.command == "worker":
+        run_worker(args)
+    elif args.command == "status":
+        queue = WorkQueue(args.queue)
+        print(json.dumps(queue.stats(), ensure_ascii=False))
+        for task in queue.failed_tasks():
+            print(f"失败任务 {task['id']}（{task['attempts']} 次）: {task['video_path']} - {task['error']}")
+        queue.close()
+    else:
+        run_export(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+import argparse
+import json
+import tempfile
+import time
+from collections import Counter
+
+from utils import (
+    extract_frames,
+    run_ocr,
+    denoise_ocr,
+    OCREngines,
+    DEFAULT_DET_MODEL,
+    FULL_DET_MAX_WIDTH
+)
+
+
+def frame_chars(ocr_results, conf_threshold):
+    """每帧去噪后文字的字符计数，用于按字符统计召回"""
+    return {
+        frame["frame_id"]: Counter("".join(b["text"] for b in frame["ocr_blocks"]).replace(" ", ""))
+        for frame in denoise_ocr(ocr_results, conf_threshold=conf_threshold)
+    }
+
+
+def char_recall(reference, candidate):
+    """candidate 覆盖 reference 字符的比例（多重集合交集 / reference 总字符数）"""
+    total = sum(sum(c.values()) for c in reference.values())
+    if total == 0:
+        return 1.0
+    hit = sum(sum((chars & candidate.get(frame_id, Counter())).values()) for frame_id, chars in reference.items())
+    return hit / total
+
+
+def timed_ocr(frames, engines, mode, det_max_width):
+    # 先跑一帧预热，避免首次推理的初始化开销计入耗时
+    run_ocr(frames[:1], mode=mode, det_max_width=det_max_width, engines=engines)
+    start = time.perf_counter()
+    results = run_ocr(frames, mode=mode, det_max_width=det_max_width, engines=engines)
+    return results, (time.perf_counter() - start) / len(frames)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="对比整帧 OCR 与不同检测宽度的多分辨率 OCR：每帧耗时与字符召回")
+    parser.add_argument("videos", nargs="+", help="用于测量的视频")
+    parser.add_argument("--interval", type=float, default=3, help="抽帧间隔（秒）")
+    parser.add_argument("--widths", type=int, nargs="+", default=[256, 320, 384, 480, 540],
+                        help="多分辨率模式的检测宽度")
+    parser.add_argument("--reference-width", type=int, default=960,
+                        help="召回基准：多分辨率模式在此检测宽度下的结果")
+    parser.add_argument("--det-model", default=DEFAULT_DET_MODEL)
+    parser.add_argument("--conf-threshold", type=float, default=0.75)
+    args = parser.parse_args()
+
+    engines = OCREngines(det_model=args.det_model)
+    configs = [("full", FULL_DET_MAX_WIDTH)] + [("multires", w) for w in args.widths]
+    rows = {config: {"sec_per_frame": [], "recall": []} for config in configs}
+
+    for video in args.videos:
+        with tempfile.TemporaryDirectory() as frame_dir:
+            frames = extract_frames(video, frame_dir, args.interval)
+            if not frames:
+                print(f"跳过（未抽到帧）: {video}")
+                continue
+            reference, _ = timed_ocr(frames, engines, "multires", args.reference_width)
+            reference = frame_chars(reference, args.conf_threshold)
+            for mode, width in configs:
+                results, sec_per_frame = timed_ocr(frames, engines, mode, width)
+                rows[(mode, width)]["sec_per_frame"].append(sec_per_frame)
+                rows[(mode, width)]["recall"].append(char_recall(reference, frame_chars(results, args.conf_threshold)))
+            print(f"已测量 {video}（{len(frames)} 帧）")
+
+    print(f"\n检测模型 {args.det_model}，召回基准为 multires@{args.reference_width}")
+    print(f"{'模式':<10}{'检测宽度':>8}{'毫秒/帧':>10}{'字符召回':>10}")
+    summary = []
+    for (mode, width), values in rows.items():
+        if not values["recall"]:
+            continue
+        ms = 1000 * sum(values["sec_per_frame"]) / len(values["sec_per_frame"])
+        recall = sum(values["recall"]) / len(values["recall"])
+        print(f"{mode:<10}{width:>10}{ms:>12.1f}{recall:>12.3f}")
+        summary.append({"mode": mode, "det_max_width": width, "ms_per_frame": round(ms, 1),
+                        "char_recall": round(recall, 3)})
+    print(json.dumps(summary, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
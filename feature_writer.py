@@ -0,0 +1,250 @@
+import json
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from json_repair import RESULT_SCHEMA, to_bool
+
+
+# 已知特征字段，其余字段统一序列化进 extra_json
+FEATURE_FIELDS = tuple(RESULT_SCHEMA)
+
+FEATURES_SCHEMA = pa.schema([
+    ("analysis_id", pa.string()),
+    ("created_at", pa.timestamp("ms")),
+    ("video_path", pa.string()),
+    ("model", pa.string()),
+    ("mode", pa.string()),
+    ("summary", pa.string()),
+    ("summary_confidence", pa.float64()),
+    ("tags", pa.list_(pa.string())),
+    ("category", pa.string()),
+    ("genre", pa.string()),
+    ("tone", pa.string()),
+    ("sentiment", pa.string()),
+    ("is_low_quality", pa.bool_()),
+    ("has_risk", pa.bool_()),
+    ("extra_json", pa.string()),
+    ("probe_action", pa.string()),
+    ("probe_text_ratio", pa.float64()),
+    ("frames_total", pa.int32()),
+    ("frames_ocr", pa.int32()),
+    ("llm_skipped", pa.bool_()),
+    ("llm_calls", pa.int32()),
+    ("json_repaired", pa.bool_()),
+    ("missing_fields", pa.list_(pa.string())),
+])
+
+SEGMENTS_SCHEMA = pa.schema([
+    ("analysis_id", pa.string()),
+    ("seg_index", pa.int32()),
+    ("start_time", pa.float64()),
+    ("end_time", pa.float64()),
+    ("text", pa.string()),
+])
+
+TIMINGS_SCHEMA = pa.schema([
+    ("analysis_id", pa.string()),
+    ("stage", pa.string()),
+    ("seconds", pa.float64()),
+])
+
+TABLE_SCHEMAS = {
+    "features": FEATURES_SCHEMA,
+    "segments": SEGMENTS_SCHEMA,
+    "timings": TIMINGS_SCHEMA,
+}
+
+
+def to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def to_str(value):
+    if value is None:
+        return None
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, ensure_ascii=False)
+    return str(value)
+
+
+class FeatureWriter:
+    """
+    列式批量输出分析结果:
+    - features: 每个视频一行特征
+    - segments: 每个视频的 OCR 时间轴片段
+    - timings:  每个阶段的耗时
+    缓冲满 row_group_size 个视频落盘一次：每张表在 output_dir/<table>/ 下新增一个完整的分片文件，
+    先写隐藏的 .tmp 文件再原子改名，目录中任何时刻都只有可读的分片（进程被杀也不会留下坏文件）。
+    max_delay_sec: 缓冲中最早的一行等待超过该时长也落盘（后台线程检查），
+    请求稀疏的常驻进程被杀时最多丢失这段时间内的结果；None 表示只按行数落盘。
+    线程安全，可被多个会话/工作线程共享。
+    """
+
+    def __init__(self, output_dir="outputs", fmt="parquet", row_group_size=256, max_delay_sec=None):
+        if fmt not in ("parquet", "arrow"):
+            raise ValueError(f"不支持的输出格式: {fmt}。可选值: ['parquet', 'arrow']")
+        if row_group_size < 1:
+            raise ValueError("row_group_size 必须大于 0")
+        if max_delay_sec is not None and max_delay_sec <= 0:
+            raise ValueError("max_delay_sec 必须大于 0")
+
+        self.output_dir = output_dir
+        self.fmt = fmt
+        self.row_group_size = row_group_size
+        self.max_delay_sec = max_delay_sec
+
+        # 每个进程/会话的分片前缀不同，下游用 pyarrow.dataset 扫描整个目录
+        self.part_name = f"part-{datetime.now().strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._buffers = {name: [] for name in TABLE_SCHEMAS}
+        self._part_seq = 0
+        self._lock = threading.Lock()
+        self._closed = False
+        self._first_buffered_at = None  # 缓冲中最早一行的加入时间
+
+        self._stop_event = threading.Event()
+        self._flusher = None
+        if max_delay_sec is not None:
+            self._flusher = threading.Thread(target=self._flush_periodically, daemon=True,
+                                             name="feature-writer-flush")
+            self._flusher.start()
+
+    def add(self, result, segments, timings, video_path="", model="", mode="", probe=None, llm_report=None,
+            analysis_id=None):
+        """
+        追加一次分析的结果，返回 analysis_id
+        probe 为 plan_ocr_frames 返回的决策信息，llm_report 为 LLMClient.last_report
+        """
+        analysis_id = analysis_id or uuid.uuid4().hex
+        result = result or {}
+        probe = probe or {}
+        llm_report = llm_report or {}
+
+        tags = result.get("tags") or []
+        if not isinstance(tags, list):
+            tags = [tags]
+        extra = {k: v for k, v in result.items() if k not in FEATURE_FIELDS}
+
+        feature_row = {
+            "analysis_id": analysis_id,
+            "created_at": datetime.now(),
+            "video_path": str(video_path),
+            "model": model,
+            "mode": mode,
+            "summary": to_str(result.get("summary")),
+            "summary_confidence": to_float(result.get("summary_confidence")),
+            "tags": [str(t) for t in tags],
+            "category": to_str(result.get("category")),
+            "genre": to_str(result.get("genre")),
+            "tone": to_str(result.get("tone")),
+            "sentiment": to_str(result.get("sentiment")),
+            "is_low_quality": to_bool(result.get("is_low_quality")),
+            "has_risk": to_bool(result.get("has_risk")),
+            "extra_json": json.dumps(extra, ensure_ascii=False) if extra else None,
+            "probe_action": probe.get("action"),
+            "probe_text_ratio": probe.get("text_ratio"),
+            "frames_total": probe.get("frames_total"),
+            "frames_ocr": probe.get("frames_ocr"),
+            "llm_skipped": probe.get("llm_skipped"),
+            "llm_calls": llm_report.get("http_calls", 0),
+            "json_repaired": bool(llm_report.get("repairs")),
+            "missing_fields": llm_report.get("missing_fields", []),
+        }
+        segment_rows = [
+            {
+                "analysis_id": analysis_id,
+                "seg_index": i,
+                "start_time": float(seg["start_time"]),
+                "end_time": float(seg["end_time"]),
+                "text": seg["text"],
+            }
+            for i, seg in enumerate(segments)
+        ]
+        timing_rows = [
+            {"analysis_id": analysis_id, "stage": stage, "seconds": float(seconds)}
+            for stage, seconds in timings.items()
+        ]
+
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("FeatureWriter 已关闭")
+            if self._first_buffered_at is None:
+                self._first_buffered_at = time.monotonic()
+            self._buffers["features"].append(feature_row)
+            self._buffers["segments"].extend(segment_rows)
+            self._buffers["timings"].extend(timing_rows)
+
+            # 以 features 行数为准触发落盘，保证三张表的同一批分片对应同一批视频
+            if len(self._buffers["features"]) >= self.row_group_size:
+                self._flush_locked()
+
+        return analysis_id
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def close(self):
+        self._stop_event.set()
+        if self._flusher is not None and self._flusher is not threading.current_thread():
+            self._flusher.join()
+        with self._lock:
+            if self._closed:
+                return
+            self._flush_locked()
+            self._closed = True
+
+    def _flush_periodically(self):
+        while not self._stop_event.wait(self.max_delay_sec / 4):
+            with self._lock:
+                if self._closed:
+                    return
+                if self._first_buffered_at is None or \
+                        time.monotonic() - self._first_buffered_at < self.max_delay_sec:
+                    continue
+                try:
+                    self._flush_locked()
+                except Exception as e:
+                    # 写盘失败保留缓冲，下一轮重试，不让后台线程退出
+                    print(f"FeatureWriter 定时落盘失败: {e}")
+
+    def _flush_locked(self):
+        if not self._buffers["features"]:
+            return
+        # 全部写完才清空缓冲并递增序号：中途失败重试时覆盖同名分片，不会重复或错位
+        part = f"{self.part_name}-{self._part_seq:05d}"
+        for name, rows in self._buffers.items():
+            if rows:
+                self._write_part(name, part, pa.Table.from_pylist(rows, schema=TABLE_SCHEMAS[name]))
+        self._part_seq += 1
+        self._buffers = {name: [] for name in TABLE_SCHEMAS}
+        self._first_buffered_at = None
+
+    def _write_part(self, name, part, table):
+        table_dir = os.path.join(self.output_dir, name)
+        os.makedirs(table_dir, exist_ok=True)
+        ext = "parquet" if self.fmt == "parquet" else "arrow"
+        path = os.path.join(table_dir, f"{part}.{ext}")
+        # 以 . 开头的临时文件会被 pyarrow.dataset 忽略
+        tmp_path = os.path.join(table_dir, f".tmp-{part}.{ext}")
+
+        if self.fmt == "parquet":
+            pq.write_table(table, tmp_path, row_group_size=len(table), compression="zstd")
+        else:
+            with pa.ipc.new_file(tmp_path, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(tmp_path, path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,321 @@
+import json
+import re
+
+
+# 默认 Prompt 要求的字段及类型
+RESULT_SCHEMA = {
+    "summary": str,
+    "summary_confidence": float,
+    "tags": list,
+    "category": str,
+    "genre": str,
+    "tone": str,
+    "sentiment": str,
+    "is_low_quality": bool,
+    "has_risk": bool,
+}
+
+# 是/否 字段附带的原因另存到对应字段
+REASON_FIELDS = {
+    "is_low_quality": "reason_for_low_quality",
+    "has_risk": "reason_for_risk",
+}
+
+# 字符串外出现的中文标点 → JSON 标点
+PUNCT_MAP = {"：": ":", "，": ",", "｛": "{", "｝": "}", "［": "[", "］": "]"}
+# 开引号 → 可接受的闭引号
+QUOTE_PAIRS = {'"': '"', "'": "'‘’", "“": "”", "”": "”“", "‘": "’", "’": "’‘"}
+PY_LITERALS = {"True": "true", "False": "false", "None": "null"}
+
+# 是/否 字段按回答开头判断：先排除“无法判断”等不确定回答，再匹配否定词（“不存在”先于“存在”）
+UNSURE_PREFIXES = ("无法", "无从", "没法", "不确定", "不清楚", "不好说", "难以", "未知", "未能", "待定", "有待", "存疑",
+                   "是否", "unknown", "unsure", "uncertain", "not sure", "n/a")
+FALSE_PREFIXES = ("不存在", "不是", "不涉及", "没有", "未发现", "未见", "否", "无")
+TRUE_PREFIXES = ("是", "有", "存在")
+# 英文短词只按完整词匹配，避免 "not"、"nothing"、"yesterday" 之类误判
+EXACT_FLAGS = {
+    "true": True, "yes": True, "y": True, "1": True,
+    "false": False, "no": False, "n": False, "0": False, "none": False,
+}
+# 首个词与原因之间的分隔符：是，疑似… / 否（…）
+FLAG_SEPARATOR = re.compile(r"[,，:：;；。.、!！?？()（）\[\]【】\s]")
+
+# 截断时末尾不完整的成员：,"key" / ,"key": / ,"key": tru
+INCOMPLETE_TAIL = re.compile(r'[,{]\s*"(?:[^"\\]|\\.)*"\s*(?::\s*[^,{}\[\]"]*)?$')
+
+
+def split_flag(value):
+    """把 "是，疑似虚假宣传" 拆成 ("是", "疑似虚假宣传")"""
+    text = str(value).strip()
+    match = FLAG_SEPARATOR.search(text)
+    if match is None:
+        return text.lower(), ""
+    return text[:match.start()].lower(), text[match.end():].strip(" ,，:：;；。.、)）]】")
+
+
+def prompt_fields(template):
+    """
+    Prompt 模板中要求的 RESULT_SCHEMA 字段，用户自定义模板去掉的字段不算缺失。
+    只扫描模板而非渲染后的 Prompt，OCR 文本里出现的 summary、tone 等词不会被当成要求；
+    按完整单词匹配，summary_confidence 不会带出 summary
+    """
+    return [f for f in RESULT_SCHEMA if re.search(rf"(?<![A-Za-z_]){f}(?![A-Za-z_])", template)]
+
+
+def to_bool(value):
+    """
+    把 LLM 返回的 是/有/存在、否/无/没有/不是、true/false、1/0 等统一转为 bool。
+    按回答开头匹配（“是的”“有风险”“无明显风险”均可识别），“无法判断”“不确定”等返回 None
+    """
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, int) and value in (0, 1):
+        return bool(value)
+    if not isinstance(value, str):
+        return None
+    text = value.strip().lower()
+    if text.startswith(UNSURE_PREFIXES):
+        return None
+    token, _ = split_flag(text)
+    if token in EXACT_FLAGS:
+        return EXACT_FLAGS[token]
+    if text.startswith(FALSE_PREFIXES):
+        return False
+    if text.startswith(TRUE_PREFIXES):
+        return True
+    return None
+
+
+def normalize_json_text(text):
+    """
+    逐字符扫描，只修改字符串之外的内容:
+    单引号/中文引号 → 双引号，中文冒号逗号 → 英文，去掉 } ] 前多余逗号，
+    True/False/None → true/false/null，截断时补齐引号与括号。
+    返回 (修复后的文本, 修复项列表)
+    """
+    out = []
+    fixes = set()
+    stack = []
+    quote = None  # 当前字符串的开引号，None 表示在字符串外
+    escaped = False
+    i = 0
+
+    while i < len(text):
+        ch = text[i]
+
+        if quote is not None:
+            if escaped:
+                out.append(ch)
+                escaped = False
+            elif ch == "\\":
+                out.append(ch)
+                escaped = True
+            elif ch in QUOTE_PAIRS[quote]:
+                out.append('"')
+                quote = None
+            elif ch == '"':
+                # 非双引号字符串里的 " 需要转义
+                out.append('\\"')
+            elif ch == "\n":
+                out.append("\\n")
+            else:
+                out.append(ch)
+            i += 1
+            continue
+
+        if ch in QUOTE_PAIRS:
+            if ch != '"':
+                fixes.add("single_quotes" if ch in "'‘’" else "chinese_punctuation")
+            out.append('"')
+            quote = ch
+        elif ch in PUNCT_MAP:
+            fixes.add("chinese_punctuation")
+            out.append(PUNCT_MAP[ch])
+            if PUNCT_MAP[ch] in "{[":
+                stack.append(PUNCT_MAP[ch])
+            elif PUNCT_MAP[ch] in "}]":
+                _close_container(out, stack, fixes)
+        elif ch in "{[":
+            out.append(ch)
+            stack.append(ch)
+        elif ch in "}]":
+            out.append(ch)
+            _close_container(out, stack, fixes)
+        elif ch.isalpha():
+            j = i
+            while j < len(text) and text[j].isalpha():
+                j += 1
+            word = text[i:j]
+            if word in PY_LITERALS:
+                fixes.add("python_literal")
+                word = PY_LITERALS[word]
+            out.append(word)
+            i = j
+            continue
+        else:
+            out.append(ch)
+        i += 1
+
+    repaired = "".join(out)
+    if quote is not None or stack:
+        fixes.add("truncated")
+        if quote is not None:
+            repaired += '"'
+        repaired = _close_truncated(repaired, stack)
+
+    return repaired, sorted(fixes)
+
+
+def _close_container(out, stack, fixes):
+    """遇到闭括号：去掉其前面的多余逗号并出栈"""
+    closing = out.pop()
+    j = len(out) - 1
+    while j >= 0 and out[j].isspace():
+        j -= 1
+    if j >= 0 and out[j] == ",":
+        del out[j]
+        fixes.add("trailing_comma")
+    out.append(closing)
+    if stack:
+        stack.pop()
+
+
+def _close_truncated(text, stack):
+    """截断输出：丢弃末尾不完整的成员，再按栈补齐括号"""
+    text = text.rstrip().rstrip(",")
+    try_text = text + "".join("}" if c == "{" else "]" for c in reversed(stack))
+    try:
+        json.loads(try_text)
+        return try_text
+    except json.JSONDecodeError:
+        pass
+
+    match = INCOMPLETE_TAIL.search(text)
+    if match:
+        # 保留开括号，丢弃逗号及不完整成员
+        keep = "{" if match.group(0).startswith("{") else ""
+        text = text[:match.start()] + keep
+        text = text.rstrip().rstrip(",")
+    return text + "".join("}" if c == "{" else "]" for c in reversed(stack))
+
+
+def parse_llm_json(content):
+    """
+    解析 LLM 输出的 JSON，失败时本地修复。
+    返回 (dict, 修复项列表)；修复后仍无法解析时抛出 ValueError
+    """
+    try:
+        data = json.loads(content)
+        if isinstance(data, dict):
+            return data, []
+    except json.JSONDecodeError:
+        pass
+
+    fixes = []
+    text = content.strip()
+    match = re.search(r"```(?:json)?\s*(.*?)(?:```|$)", text, re.DOTALL)
+    if match and "```" in text:
+        text = match.group(1).strip()
+        fixes.append("code_fence")
+
+    start = min((p for p in (text.find("{"), text.find("｛")) if p >= 0), default=-1)
+    if start < 0:
+        raise ValueError(f"LLM 返回非 JSON 内容: {content[:200]}...")
+    end = max(text.rfind("}"), text.rfind("｝"))
+    if start > 0 or (0 <= end < len(text) - 1 and text[end + 1:].strip()):
+        fixes.append("extracted_object")
+    # 截断的输出没有闭括号，保留到结尾
+    text = text[start:end + 1] if end > start and _balanced(text[start:end + 1]) else text[start:]
+
+    repaired, normalize_fixes = normalize_json_text(text)
+    try:
+        data = json.loads(repaired)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"LLM 返回的 JSON 无法修复 ({e}): {content[:200]}...")
+    if not isinstance(data, dict):
+        raise ValueError(f"LLM 返回的 JSON 不是对象: {content[:200]}...")
+
+    return data, fixes + normalize_fixes
+
+
+def _balanced(text):
+    """粗略判断花括号是否配平（忽略字符串内的括号）"""
+    depth = 0
+    in_str = False
+    escaped = False
+    for ch in text:
+        if in_str:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_str = False
+        elif ch == '"':
+            in_str = True
+        elif ch in "{｛":
+            depth += 1
+        elif ch in "}｝":
+            depth -= 1
+    return depth == 0
+
+
+def validate_result(data, fields=None):
+    """
+    按 RESULT_SCHEMA 校验并规整字段类型:
+    - summary_confidence: "0.8" / "80%" / 85 → 0.8 / 0.8 / 0.85，须在 [0, 1]
+    - tags: 字符串按 , ， 、 拆分为列表
+    - is_low_quality / has_risk: 是/否 → bool，附带原因另存 reason_for_*
+    无法规整的字段保留模型原值并计入缺失，补全失败时原值不丢
+    返回 (规整后的 dict, 缺失或无效的字段列表)
+    """
+    fields = list(RESULT_SCHEMA) if fields is None else fields
+    result = dict(data)
+    missing = []
+
+    for field in fields:
+        value = result.get(field)
+        expected = RESULT_SCHEMA[field]
+
+        if expected is str:
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                value = str(value)
+            ok = isinstance(value, str) and value.strip() != ""
+
+        elif expected is float:
+            if isinstance(value, str):
+                text = value.strip()
+                try:
+                    value = float(text.rstrip("%")) / 100 if text.endswith("%") else float(text)
+                except ValueError:
+                    value = None
+            # 按百分制给出的 1~100 换算为 0~1
+            if isinstance(value, (int, float)) and not isinstance(value, bool) and 1 < value <= 100:
+                value = value / 100
+            ok = isinstance(value, (int, float)) and not isinstance(value, bool) and 0 <= value <= 1
+            if ok:
+                value = float(value)
+
+        elif expected is list:
+            if isinstance(value, str):
+                value = [t.strip() for t in re.split(r"[,，、;；]", value) if t.strip()]
+            ok = isinstance(value, list) and len(value) > 0
+            if ok:
+                value = [str(t) for t in value]
+
+        else:  # bool
+            flag = to_bool(value)
+            if flag is not None and isinstance(value, str):
+                _, reason = split_flag(value)
+                reason_field = REASON_FIELDS.get(field)
+                if reason and reason_field and not result.get(reason_field):
+                    result[reason_field] = reason
+            value = flag
+            ok = flag is not None
+
+        if ok:
+            result[field] = value
+        else:
+            missing.append(field)
+
+    return result, missing
@@ -2,15 +2,28 @@ import json
 import time
 
 import requests
-import time
+from json_repair import RESULT_SCHEMA, parse_llm_json, validate_result
+
+
+# 只补缺失字段时追加在原 Prompt 之后
+FIELD_RECALL_TEMPLATE = """
+
+【补充要求】
+上一次输出缺少以下字段或字段格式无效：{fields}。
+请只输出包含这些字段的 JSON 对象，不要输出其他字段和说明。"""
+
+
 class LLMClient:
     def __init__(self, api_key, api_url, model_name, max_retries=3):
         self.api_key = api_key
         self.api_url = api_url
         self.model_name = model_name
         self.max_retries = max_retries
+        # 最近一次 analyze 的调用次数、本地修复项、补字段/整体重试情况
+        self.last_report = {}
 
-    def analyze(self, prompt, timeout=60):
+    def _chat(self, prompt, timeout):
+        """发送一次请求，返回模型输出的原始文本"""
         headers = {
             "Content-Type": "application/json",
             "Authorization": f"Bearer {self.api_key}"
@@ -23,35 +36,83 @@ class LLMClient:
             "response_format": {"type": "json_object"}  # 👈 关键！强制模型输出 JSON（仅支持部分模型）
         }
 
+        response = requests.post(
+            self.api_url,
+            headers=headers,
+            data=json.dumps(payload),
+            timeout=timeout
+        )
+        response.raise_for_status()
+
+        result = response.json()
+        return result["choices"][0]["message"]["content"]
+
+    def analyze(self, prompt, timeout=60, fields=None):
+        """fields 为需要校验的字段（见 json_repair.prompt_fields），默认校验全部 RESULT_SCHEMA 字段"""
+        fields = list(RESULT_SCHEMA) if fields is None else list(fields)
+        report = {"http_calls": 0, "repairs": [], "full_recalls": 0, "field_recall": [], "missing_fields": []}
+
         for attempt in range(self.max_retries):
             try:
-                response = requests.post(
-                    self.api_url,
-                    headers=headers,
-                    data=json.dumps(payload),
-                    timeout=timeout
-                )
-                response.raise_for_status()
-                
-                result = response.json()
-                content = result["choices"][0]["message"]["content"]
-                
-                # 尝试解析 JSON（防御模型输出带 markdown 或解释）
-                try:
-                    return json.loads(content)
-                except json.JSONDecodeError:
-                    # 如果失败，尝试提取 ```json ... ``` 中的内容
-                    import re
-                    match = re.search(r"```(?:json)?\s*({.*?})\s*```", content, re.DOTALL)
-                    if match:
-                        return json.loads(match.group(1))
-                    else:
-                        raise ValueError(f"LLM 返回非 JSON 内容: {content[:200]}...")
+                report["http_calls"] += 1
+                content = self._chat(prompt, timeout)
+                # 解析失败先本地修复（尾逗号、单引号、中文标点、截断等），修不好才整体重试
+                data, report["repairs"] = parse_llm_json(content)
+                break
 
             except (requests.RequestException, ValueError, KeyError) as e:
                 print(f"LLM 调用失败 (尝试 {attempt + 1}/{self.max_retries}): {e}")
                 if attempt == self.max_retries - 1:
+                    self.last_report = report
                     raise RuntimeError("LLM 分析失败，已达到最大重试次数") from e
+                report["full_recalls"] += 1
                 time.sleep(2 ** attempt)  # 指数退避
 
-        raise RuntimeError("Unexpected error in LLMClient")
+        result, missing = validate_result(data, fields)
+        if missing:
+            result, missing = self._recall_fields(prompt, result, missing, fields, timeout, report)
+
+        report["missing_fields"] = missing
+        self.last_report = report
+        return result
+
+    def _recall_fields(self, prompt, result, missing, fields, timeout, report):
+        """只让模型重新生成缺失/无效字段并合并，失败时保留已有结果"""
+        report["field_recall"] = list(missing)
+        report["http_calls"] += 1
+        try:
+            content = self._chat(prompt + FIELD_RECALL_TEMPLATE.format(fields="、".join(missing)), timeout)
+            data, _ = parse_llm_json(content)
+        except (requests.RequestException, ValueError, KeyError) as e:
+            print(f"LLM 补全字段失败 ({'、'.join(missing)}): {e}")
+            return result, missing
+
+        merged = dict(result)
+        for field in missing:
+            if field in data:
+                merged[field] = data[field]
+        return validate_result(merged, fields)
+
+
+class StubLLMClient:
+    """本地压测用的假大模型：不发网络请求，固定延迟后返回固定结构的结果"""
+
+    def __init__(self, model_name="stub", delay_sec=0.5):
+        self.model_name = model_name
+        self.delay_sec = delay_sec
+        self.last_report = {}
+
+    def analyze(self, prompt, timeout=60, fields=None):
+        time.sleep(self.delay_sec)
+        self.last_report = {"http_calls": 0, "repairs": [], "full_recalls": 0, "field_recall": [], "missing_fields": []}
+        return {
+            "summary": f"[stub] 基于 {len(prompt)} 字符的 prompt 生成的摘要",
+            "summary_confidence": 0.5,
+            "tags": ["stub"],
+            "category": "其他",
+            "genre": "其他",
+            "tone": "客观",
+            "sentiment": "中性",
+            "is_low_quality": "否",
+            "has_risk": "否",
+        }
@@ -1,30 +1,19 @@
 import json
 import os
 import time
-from utils import (
-    extract_frames,
-    run_ocr,
-    denoise_ocr,
-    merge_text_across_frames_for_understanding,
-    build_timeline,
-    build_prompt
-)
 from llm_client import LLMClient
+from feature_writer import FeatureWriter
+from pipeline import get_analysis_mode_config, analyze_video
 
 # 最终实现
 if __name__ == "__main__":
     start = time.perf_counter()
     video_path = "sample_videos/体育新闻热点.mp4"
     frame_dir = "frames"
-    #OCR 提取并保存为指定格式
 
-    interval_sec=5#抽帧间隔
-    frames = extract_frames(video_path, frame_dir, interval_sec)
-    ocr_raw = run_ocr(frames)
-    ocr_cleaned = denoise_ocr(ocr_raw, conf_threshold=0.75)
-    final_segments = merge_text_across_frames_for_understanding(ocr_cleaned,sim_threshold=0.92,time_gap_merge=interval_sec + 1 )
-    timeline_text = build_timeline(final_segments)
-        
+    # 抽帧间隔 5 秒、相似度 0.92、合并间隔 6 秒；文字稀少时稀疏 OCR 而非直接跳过
+    mode_config = dict(get_analysis_mode_config("快速摘要"), probe_policy="sparse")
+
     default_prompt = """你是一个专业的短视频内容理解与审核模型。
     你将基于视频中通过 OCR 提取的文字内容，对视频进行多维度分析。
 
@@ -51,18 +40,30 @@ if __name__ == "__main__":
     【输出格式】
     只输出一个合法 JSON 对象，字段名必须为上述英文名。"""
 
-    prompt = build_prompt(default_prompt,timeline_text=timeline_text)
-
     llm = LLMClient(
         api_key=os.getenv('DASHSCOPE_API_KEY'),
         api_url="https://dashscope.aliyuncs.com/compatible-mode/v1/chat/completions",
         model_name="qwen-plus"  # 示例
     )
     try:
-        analysis_result = llm.analyze(prompt)
-        print(json.dumps(analysis_result, ensure_ascii=False, indent=2))
-        
-        
+        output = analyze_video(video_path, mode_config, default_prompt, llm, frame_dir=frame_dir)
+        print("文字密度探测:", json.dumps(output["text_probe"], ensure_ascii=False))
+        if output["llm_report"]:
+            print("大模型调用:", json.dumps(output["llm_report"], ensure_ascii=False))
+        print(json.dumps(output["result"], ensure_ascii=False, indent=2))
+
+        # 结构化输出：特征 / 时间轴 / 阶段耗时写入 outputs/ 下的 Parquet 分片
+        with FeatureWriter(output_dir="outputs", fmt="parquet") as writer:
+            writer.add(
+                output["result"],
+                output["segments"],
+                output["timings"],
+                video_path=video_path,
+                model=llm.model_name,
+                probe=output["text_probe"],
+                llm_report=output["llm_report"]
+            )
+
     except Exception as e:
         print("分析失败:", str(e))
     elapsed = time.perf_counter() - start
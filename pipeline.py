@@ -0,0 +1,162 @@
+import tempfile
+
+from json_repair import prompt_fields
+from utils import (
+    extract_frames,
+    run_ocr,
+    denoise_ocr,
+    merge_text_across_frames_for_understanding,
+    build_timeline,
+    build_prompt,
+    stage_timer,
+    probe_text_density,
+    plan_ocr_frames,
+    build_insufficient_text_result,
+    OCREngines
+)
+
+
+default_prompt = """你是一个专业的短视频内容理解与审核模型。
+你将基于视频中通过 OCR 提取的文字内容，对视频进行多维度分析。
+
+【背景说明】
+- 以下文字按时间顺序提取自视频画面（包括字幕、标题、水印等）。
+- 若某文本在连续时间段重复出现，通常表示其为核心信息或固定标识。
+- 文本可能包含口语化表达、营销话术或不完整句子，请结合整体语境理解。
+
+【视频文字时间轴】
+{timeline_text}
+
+【分析任务】
+请严格按以下各项完成分析，并以 JSON 格式输出，不要任何额外说明：
+
+1. summary: 用一句话概括视频主要内容
+2. summary_confidence:给出摘要的置信度(0-1)
+3. tags: 给出 3~5 个内容标签（字符串列表）
+4. category: 内容类型（如 新闻、体育、娱乐、广告 等）
+5. genre: 内容体裁（如 赛事报道、人物特写、快讯 等）
+6. tone: 整体调性（如 客观、煽情、幽默、严肃 等）
+7. sentiment: 情感倾向（如 积极、消极、中性）
+8. is_low_quality: 是否为低质内容（是/否）若是请描述原因
+9. has_risk: 是否存在潜在违规风险（是/否）若是请描述原因
+
+【输出格式】
+只输出一个合法 JSON 对象，字段名必须为上述英文名。"""
+
+
+def get_analysis_mode_config(mode: str):
+
+    MODE_CONFIGS = {
+        "快速摘要": {
+            "sim_threshold": 0.92,      # 高相似才合并,保留关键信息
+            "time_gap_merge": 6,        # 较长间隔,减少片段数量
+            "interval_sec": 5,
+            "min_text_ratio": 0.4,      # 探测帧含文字比例低于此值视为文字稀少
+            "probe_policy": "skip",     # 文字稀少直接返回“文字不足”,不调 OCR/LLM
+            "ocr_mode": "multires",     # 小图检测 + 原图裁剪识别
+            "det_max_width": 320,       # 检测/探测宽度:只求主要字幕,检测最省
+        },
+        "全面分析": {
+            "sim_threshold": 0.85,      # 中等相似度,平衡细节与冗余
+            "time_gap_merge": 3,        # 适中合并窗口
+            "interval_sec": 3,
+            "min_text_ratio": 0.4,
+            "probe_policy": "sparse",   # 文字稀少时稀疏抽帧 OCR
+            "ocr_mode": "multires",
+            "det_max_width": 384,
+        },
+        "审核模式": {
+            "sim_threshold": 0.78,      # 更敏感,保留更多原文细节(防漏检)
+            "time_gap_merge": 2,        # 短间隔,避免跨镜头误合
+            "interval_sec": 1,
+            "min_text_ratio": 0.2,      # 防漏检:阈值更低,且不直接跳过
+            "probe_policy": "sparse",
+            "ocr_mode": "multires",
+            "det_max_width": 480,       # 防漏检:检测宽度更大,保留细小文字
+        },
+        "自定义": {
+            "sim_threshold": 0.90,      # 默认值,实际由前端传参覆盖(此处仅兜底)
+            "time_gap_merge": 6,
+            "interval_sec": 1,
+            "min_text_ratio": 0.4,
+            "probe_policy": "sparse",
+            "ocr_mode": "multires",
+            "det_max_width": 384,
+        }
+    }
+
+    if mode not in MODE_CONFIGS:
+        raise ValueError(f"不支持的分析模式: {mode}。可选值: {list(MODE_CONFIGS.keys())}")
+
+    return MODE_CONFIGS[mode]
+
+
+def analyze_video(video_path, mode_config, prompt_template, llm, engines=None, frame_dir=None, conf_threshold=0.75,
+                  progress=None):
+    """
+    完整分析流程：抽帧 → 文字密度探测 → OCR → 去噪合并 → 大模型
+    engines:  可选的 OCREngines（常驻服务/页面复用），不传则本次分析新建一份，探测与 OCR 共用
+    progress: 可选回调，每个阶段开始前以阶段名调用（extract_frames/probe/ocr/merge/llm）
+    返回:
+    {"result": 特征, "segments": 时间轴片段, "timeline_text": 时间轴文本, "timings": 各阶段耗时,
+     "text_probe": 探测决策, "llm_report": JSON 修复与重试情况（未调用大模型时为空）}
+    """
+    timings = {}
+    llm_report = {}
+    frame_dir = frame_dir or tempfile.mkdtemp()
+    engines = engines or OCREngines()
+    progress = progress or (lambda stage: None)
+
+    progress("extract_frames")
+    with stage_timer(timings, "extract_frames"):
+        frames = extract_frames(video_path, frame_dir, mode_config["interval_sec"])
+
+    progress("probe")
+    with stage_timer(timings, "probe"):
+        probe = probe_text_density(frames, detector=engines.detector, det_max_width=mode_config["det_max_width"])
+    ocr_frames, probe_decision = plan_ocr_frames(
+        frames,
+        probe,
+        min_text_ratio=mode_config["min_text_ratio"],
+        policy=mode_config["probe_policy"]
+    )
+
+    progress("ocr")
+    with stage_timer(timings, "ocr"):
+        ocr_raw = run_ocr(
+            ocr_frames,
+            mode=mode_config["ocr_mode"],
+            det_max_width=mode_config["det_max_width"],
+            engines=engines
+        ) if ocr_frames else []
+
+    progress("merge")
+    with stage_timer(timings, "merge"):
+        ocr_cleaned = denoise_ocr(ocr_raw, conf_threshold=conf_threshold)
+        final_segments = merge_text_across_frames_for_understanding(
+            ocr_cleaned,
+            sim_threshold=mode_config["sim_threshold"],
+            # 稀疏 OCR 时帧间距放大了 frame_step 倍，合并窗口同步放大
+            time_gap_merge=mode_config["time_gap_merge"] * probe_decision["frame_step"]
+        )
+        timeline_text = build_timeline(final_segments)
+
+    if not final_segments:
+        # 时间轴为空，不再把空文本发给大模型
+        probe_decision["llm_skipped"] = True
+        result = build_insufficient_text_result()
+    else:
+        progress("llm")
+        prompt = build_prompt(prompt_template, timeline_text=timeline_text)
+        with stage_timer(timings, "llm"):
+            result = llm.analyze(prompt, fields=prompt_fields(prompt_template))
+        llm_report = llm.last_report
+
+    return {
+        "result": result,
+        "segments": final_segments,
+        "timeline_text": timeline_text,
+        "timings": timings,
+        "text_probe": probe_decision,
+        "llm_report": llm_report,
+    }
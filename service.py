@@ -0,0 +1,376 @@
+import argparse
+import base64
+import json
+import logging
+import os
+import queue
+import signal
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+from llm_client import LLMClient, StubLLMClient
+from pipeline import default_prompt, get_analysis_mode_config, analyze_video
+from feature_writer import FeatureWriter
+from utils import OCREngines, DEFAULT_DET_MODEL
+
+
+API_URL = "https://dashscope.aliyuncs.com/compatible-mode/v1/chat/completions"
+MODEL_OPTIONS = ("qwen-turbo", "qwen-plus", "qwen-max")
+
+# 自定义模式可覆盖的参数及取值范围（与 app.py 滑块一致）
+CUSTOM_PARAM_RANGES = {
+    "sim_threshold": (0.7, 1.0),
+    "time_gap_merge": (3, 10),
+    "interval_sec": (1, 10),
+    "det_max_width": (256, 960),
+}
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+class ServiceOverloaded(Exception):
+    """排队已满，拒绝新请求"""
+
+
+class AnalysisService:
+    """
+    常驻分析服务:
+    - 每个工作线程持有一份预热的 OCREngines，跨请求复用
+    - 准入控制：执行中 + 排队的请求数超过 workers + max_queue 时直接拒绝，
+      在读取请求体之前判断（try_admit），过载时不为被拒的上传分配内存
+    """
+
+    def __init__(self, workers=2, max_queue=4, stub_llm=False, stub_delay=0.5,
+                 feature_dir=None, request_timeout=600, det_model=DEFAULT_DET_MODEL, flush_delay=30):
+        if workers < 1:
+            raise ValueError("workers 必须大于 0")
+        if max_queue < 0:
+            raise ValueError("max_queue 不能小于 0")
+
+        self.workers = workers
+        self.max_queue = max_queue
+        self.stub_llm = stub_llm
+        self.stub_delay = stub_delay
+        self.request_timeout = request_timeout
+
+        logger.info(f"预加载 {workers} 份 OCR 模型...")
+        self._engine_pool = queue.Queue()
+        for _ in range(workers):
+            self._engine_pool.put(OCREngines(det_model=det_model))
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="analysis")
+
+        self._lock = threading.Lock()
+        self._pending = 0   # 已准入未完成（读取请求体 + 排队 + 执行中）
+        self._running = 0
+        self._started_at = time.time()
+        self._metrics = {
+            "accepted": 0,
+            "rejected": 0,
+            "completed": 0,
+            "failed": 0,
+            "llm_skipped": 0,
+            "frames_saved": 0,
+            "llm_calls": 0,
+            "llm_analyses": 0,
+            "json_repaired": 0,
+            "field_recalls": 0,
+            "full_recalls": 0,
+            "latency_sum": 0.0,
+            "latency_max": 0.0,
+            "stage_seconds": {},
+        }
+
+        # 请求稀疏时按时间落盘，被杀时最多丢失 flush_delay 秒内的结果
+        self._writer = FeatureWriter(output_dir=feature_dir, max_delay_sec=flush_delay) if feature_dir else None
+
+    def parse_request(self, body):
+        """校验请求体，返回 (video_path, 是否临时文件, mode, mode_config, prompt, model)"""
+        mode = body.get("mode", "全面分析")
+        mode_config = dict(get_analysis_mode_config(mode))
+        if mode == "自定义":
+            for key, value in (body.get("params") or {}).items():
+                if key not in CUSTOM_PARAM_RANGES:
+                    raise ValueError(f"不支持的自定义参数: {key}。可选值: {list(CUSTOM_PARAM_RANGES)}")
+                low, high = CUSTOM_PARAM_RANGES[key]
+                if not isinstance(value, (int, float)) or not low <= value <= high:
+                    raise ValueError(f"自定义参数 {key} 取值须在 [{low}, {high}] 之间")
+                mode_config[key] = value
+
+        prompt = body.get("prompt") or default_prompt
+        if "{timeline_text}" not in prompt:
+            raise ValueError("Prompt 中必须包含 {timeline_text} 占位符")
+
+        model = body.get("model", "qwen-plus")
+        if not self.stub_llm and model not in MODEL_OPTIONS:
+            raise ValueError(f"不支持的模型: {model}。可选值: {list(MODEL_OPTIONS)}")
+
+        if body.get("video_base64"):
+            try:
+                data = base64.b64decode(body["video_base64"], validate=True)
+            except ValueError:
+                raise ValueError("video_base64 不是合法的 base64 编码")
+            with tempfile.NamedTemporaryFile(delete=False, suffix=".mp4") as tmp:
+                tmp.write(data)
+            return tmp.name, True, mode, mode_config, prompt, model
+
+        video_path = body.get("video_path")
+        if not video_path:
+            raise ValueError("需要提供 video_path 或 video_base64")
+        if not os.path.isfile(video_path):
+            raise ValueError(f"视频文件不存在: {video_path}")
+        return video_path, False, mode, mode_config, prompt, model
+
+    def submit(self, body):
+        """
+        同步执行一次分析，调用前须已通过 try_admit 占用名额。
+        请求无效时在此释放名额；提交后由任务结束时释放（超时返回后任务仍占用名额）
+        """
+        try:
+            video_path, is_temp, mode, mode_config, prompt, model = self.parse_request(body)
+        except Exception:
+            self.release()
+            raise
+        with self._lock:
+            self._metrics["accepted"] += 1
+
+        future = self._executor.submit(self._run, video_path, is_temp, mode, mode_config, prompt, model)
+        # 超时只影响本次响应，任务仍在后台完成并占用名额
+        return future.result(timeout=self.request_timeout)
+
+    def try_admit(self):
+        """占用一个名额，执行中 + 排队已满时抛出 ServiceOverloaded"""
+        with self._lock:
+            if self._pending >= self.workers + self.max_queue:
+                self._metrics["rejected"] += 1
+                raise ServiceOverloaded()
+            self._pending += 1
+
+    def release(self):
+        """归还 try_admit 占用、但未提交分析的名额"""
+        with self._lock:
+            self._pending -= 1
+
+    def _run(self, video_path, is_temp, mode, mode_config, prompt, model):
+        engines = self._engine_pool.get()
+        with self._lock:
+            self._running += 1
+        start = time.perf_counter()
+
+        try:
+            if self.stub_llm:
+                llm = StubLLMClient(model_name=model, delay_sec=self.stub_delay)
+            else:
+                llm = LLMClient(api_key=os.getenv('DASHSCOPE_API_KEY'), api_url=API_URL, model_name=model)
+
+            with tempfile.TemporaryDirectory() as frame_dir:
+                output = analyze_video(video_path, mode_config, prompt, llm, engines=engines, frame_dir=frame_dir)
+
+            if self._writer is not None:
+                output["analysis_id"] = self._writer.add(
+                    output["result"],
+                    output["segments"],
+                    output["timings"],
+                    video_path="<upload>" if is_temp else video_path,
+                    model=model,
+                    mode=mode,
+                    probe=output["text_probe"],
+                    llm_report=output["llm_report"]
+                )
+
+            elapsed = time.perf_counter() - start
+            output["elapsed"] = round(elapsed, 3)
+            with self._lock:
+                self._metrics["completed"] += 1
+                self._metrics["latency_sum"] += elapsed
+                self._metrics["latency_max"] = max(self._metrics["latency_max"], elapsed)
+                self._metrics["frames_saved"] += output["text_probe"]["frames_saved"]
+                if output["text_probe"]["llm_skipped"]:
+                    self._metrics["llm_skipped"] += 1
+                llm_report = output["llm_report"]
+                if llm_report:
+                    self._metrics["llm_analyses"] += 1
+                    self._metrics["llm_calls"] += llm_report["http_calls"]
+                    self._metrics["full_recalls"] += llm_report["full_recalls"]
+                    self._metrics["json_repaired"] += bool(llm_report["repairs"])
+                    self._metrics["field_recalls"] += bool(llm_report["field_recall"])
+                for stage, seconds in output["timings"].items():
+                    stage_seconds = self._metrics["stage_seconds"]
+                    stage_seconds[stage] = stage_seconds.get(stage, 0.0) + seconds
+            return output
+
+        except Exception:
+            with self._lock:
+                self._metrics["failed"] += 1
+            logger.error("Analysis failed", exc_info=True)
+            raise
+
+        finally:
+            self._engine_pool.put(engines)
+            with self._lock:
+                self._running -= 1
+                self._pending -= 1
+            if is_temp:
+                os.remove(video_path)
+
+    def health(self):
+        with self._lock:
+            m = self._metrics
+            completed = m["completed"]
+            analyses = m["llm_analyses"]
+            return {
+                "status": "ok",
+                "uptime_sec": round(time.time() - self._started_at, 1),
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "running": self._running,
+                "queued": self._pending - self._running,
+                "stub_llm": self.stub_llm,
+                "accepted": m["accepted"],
+                "rejected": m["rejected"],
+                "completed": completed,
+                "failed": m["failed"],
+                "llm_skipped": m["llm_skipped"],
+                "frames_saved": m["frames_saved"],
+                # 每次大模型分析平均请求数，及本地修复 / 补字段 / 整体重试的比例
+                "llm_calls_per_analysis": round(m["llm_calls"] / analyses, 3) if analyses else 0.0,
+                "json_repair_rate": round(m["json_repaired"] / analyses, 3) if analyses else 0.0,
+                "field_recall_rate": round(m["field_recalls"] / analyses, 3) if analyses else 0.0,
+                "full_recall_rate": round(m["full_recalls"] / analyses, 3) if analyses else 0.0,
+                "latency_avg_sec": round(m["latency_sum"] / completed, 3) if completed else 0.0,
+                "latency_max_sec": round(m["latency_max"], 3),
+                "stage_avg_sec": {
+                    stage: round(seconds / completed, 3)
+                    for stage, seconds in m["stage_seconds"].items()
+                } if completed else {},
+            }
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        if self._writer is not None:
+            self._writer.close()
+
+
+class AnalysisHandler(BaseHTTPRequestHandler):
+    """
+    GET  /health   服务状态与指标
+    POST /analyze  JSON: {video_path | video_base64, mode, prompt, model, params}
+    """
+
+    service = None
+    max_body_bytes = 200 * 1024 * 1024
+
+    def do_GET(self):
+        if urlparse(self.path).path == "/health":
+            self._send_json(200, self.service.health())
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        if urlparse(self.path).path != "/analyze":
+            self._send_json(404, {"error": "not found"})
+            return
+
+        length = int(self.headers.get("Content-Length") or 0)
+        if length <= 0:
+            self._send_json(400, {"error": "请求体为空"})
+            return
+        if length > self.max_body_bytes:
+            self._send_json(413, {"error": f"请求体超过 {self.max_body_bytes} 字节"})
+            return
+
+        # 先准入再读请求体：过载时不读取、不缓冲上传内容，直接返回 503 并关闭连接
+        try:
+            self.service.try_admit()
+        except ServiceOverloaded:
+            self.close_connection = True
+            self._send_json(503, {"error": "服务繁忙，请稍后重试"},
+                            headers={"Retry-After": "1", "Connection": "close"})
+            return
+
+        try:
+            body = json.loads(self.rfile.read(length).decode("utf-8"))
+            if not isinstance(body, dict):
+                raise ValueError("请求体必须是 JSON 对象")
+        except ValueError as e:
+            self.service.release()
+            self._send_json(400, {"error": f"请求体不是合法 JSON: {e}"})
+            return
+        except Exception:
+            self.service.release()
+            raise
+
+        try:
+            output = self.service.submit(body)
+        except ValueError as e:
+            self._send_json(400, {"error": str(e)})
+        except FutureTimeout:
+            self._send_json(504, {"error": "分析超时"})
+        except Exception as e:
+            self._send_json(500, {"error": f"分析失败: {e}"})
+        else:
+            self._send_json(200, output)
+
+    def _send_json(self, status, payload, headers=None):
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        logger.info("%s - %s", self.address_string(), format % args)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="视频内容分析 HTTP 服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=2, help="并行分析数（每个预加载一份 OCR 模型）")
+    parser.add_argument("--max-queue", type=int, default=4, help="最多排队请求数，超过返回 503")
+    parser.add_argument("--timeout", type=float, default=600, help="单次请求等待上限（秒）")
+    parser.add_argument("--stub-llm", action="store_true", help="使用假大模型，便于本地压测")
+    parser.add_argument("--stub-delay", type=float, default=0.5, help="假大模型的响应延迟（秒）")
+    parser.add_argument("--det-model", default=DEFAULT_DET_MODEL,
+                        help="文本检测模型，PP-OCRv5_mobile_det 更快但小字召回更低")
+    parser.add_argument("--feature-dir", default=None, help="结构化结果输出目录，不传则不落盘")
+    parser.add_argument("--flush-delay", type=float, default=30, help="结构化结果最长缓冲时间（秒）")
+    args = parser.parse_args()
+
+    service = AnalysisService(
+        workers=args.workers,
+        max_queue=args.max_queue,
+        stub_llm=args.stub_llm,
+        stub_delay=args.stub_delay,
+        det_model=args.det_model,
+        feature_dir=args.feature_dir,
+        flush_delay=args.flush_delay,
+        request_timeout=args.timeout
+    )
+    AnalysisHandler.service = service
+    server = ThreadingHTTPServer((args.host, args.port), AnalysisHandler)
+
+    def handle_sigterm(signum, frame):
+        # 容器停止/kill 时走与 Ctrl+C 相同的退出路径，等待进行中的分析并落盘缓冲结果
+        raise KeyboardInterrupt
+
+    signal.signal(signal.SIGTERM, handle_sigterm)
+    logger.info(f"分析服务已启动: http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+
+
+if __name__ == "__main__":
+    main()
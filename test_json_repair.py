@@ -0,0 +1,104 @@
+import pytest
+
+from json_repair import parse_llm_json, prompt_fields, to_bool, validate_result
+
+
+@pytest.mark.parametrize("value", [
+    "是", "是的", "是，疑似虚假宣传", "有", "有风险", "存在风险：夸大功效", "存在违规", "true", "Yes", "y", "1", 1, True,
+])
+def test_to_bool_true(value):
+    assert to_bool(value) is True
+
+
+@pytest.mark.parametrize("value", [
+    "否", "否（内容完整）", "无", "无风险", "无明显风险", "没有", "不是", "不存在", "不存在违规", "未发现明显风险",
+    "false", "No", "n", "0", 0, False,
+])
+def test_to_bool_false(value):
+    assert to_bool(value) is False
+
+
+@pytest.mark.parametrize("value", [
+    "无法判断", "无法确定", "不确定", "未知", "是否违规需人工复核", "unknown", "not sure", "", None, 2, 0.5, [],
+])
+def test_to_bool_unsure(value):
+    assert to_bool(value) is None
+
+
+def test_validate_result_flags_and_reasons():
+    data = {"has_risk": "存在风险：夸大功效", "is_low_quality": "无明显问题"}
+    result, missing = validate_result(data, ["has_risk", "is_low_quality"])
+    assert missing == []
+    assert result["has_risk"] is True
+    assert result["reason_for_risk"] == "夸大功效"
+    assert result["is_low_quality"] is False
+    assert "reason_for_low_quality" not in result
+
+
+def test_validate_result_keeps_raw_value_when_invalid():
+    data = {"has_risk": "无法判断", "summary_confidence": "高"}
+    result, missing = validate_result(data, ["has_risk", "summary_confidence"])
+    assert missing == ["has_risk", "summary_confidence"]
+    assert result["has_risk"] == "无法判断"
+    assert result["summary_confidence"] == "高"
+
+
+@pytest.mark.parametrize("value, expected", [(0.8, 0.8), ("0.8", 0.8), ("80%", 0.8), (85, 0.85), (1, 1.0)])
+def test_validate_result_confidence(value, expected):
+    result, missing = validate_result({"summary_confidence": value}, ["summary_confidence"])
+    assert missing == []
+    assert result["summary_confidence"] == pytest.approx(expected)
+
+
+def test_validate_result_splits_tags():
+    result, missing = validate_result({"tags": "体育，足球、新闻"}, ["tags"])
+    assert missing == []
+    assert result["tags"] == ["体育", "足球", "新闻"]
+
+
+def test_prompt_fields_reads_whole_words():
+    template = "1. summary_confidence: 置信度\n2. tone: 调性\n【视频文字时间轴】\n{timeline_text}"
+    assert prompt_fields(template) == ["summary_confidence", "tone"]
+
+
+def test_parse_valid_json_has_no_repairs():
+    data, fixes = parse_llm_json('{"summary": "a", "tags": ["x"]}')
+    assert data == {"summary": "a", "tags": ["x"]}
+    assert fixes == []
+
+
+@pytest.mark.parametrize("content, expected, fix", [
+    ('```json\n{"summary": "a"}\n```', {"summary": "a"}, "code_fence"),
+    ('分析结果如下：{"summary": "a"} 以上。', {"summary": "a"}, "extracted_object"),
+    ('{"summary": "a", "tags": ["x", "y",],}', {"summary": "a", "tags": ["x", "y"]}, "trailing_comma"),
+    ("{'summary': 'a', 'has_risk': '否'}", {"summary": "a", "has_risk": "否"}, "single_quotes"),
+    ('｛“summary”：“a”，“tone”：“客观”｝', {"summary": "a", "tone": "客观"}, "chinese_punctuation"),
+    ('{"has_risk": True, "extra": None}', {"has_risk": True, "extra": None}, "python_literal"),
+])
+def test_parse_repairs(content, expected, fix):
+    data, fixes = parse_llm_json(content)
+    assert data == expected
+    assert fix in fixes
+
+
+def test_parse_keeps_quotes_inside_strings():
+    data, _ = parse_llm_json('{“summary”：“他说"好"”, "tone": "客观",}')
+    assert data == {"summary": '他说"好"', "tone": "客观"}
+
+
+@pytest.mark.parametrize("content, expected", [
+    ('{"summary": "a", "tags": ["x", "y"', {"summary": "a", "tags": ["x", "y"]}),
+    ('{"summary": "a", "tone": "客', {"summary": "a", "tone": "客"}),
+    ('{"summary": "a", "has_risk": tru', {"summary": "a"}),
+    ('{"summary": "a", "tone"', {"summary": "a"}),
+])
+def test_parse_truncated(content, expected):
+    data, fixes = parse_llm_json(content)
+    assert data == expected
+    assert "truncated" in fixes
+
+
+@pytest.mark.parametrize("content", ["抱歉，我无法分析该视频。", '["a", "b"]'])
+def test_parse_rejects_non_object(content):
+    with pytest.raises(ValueError):
+        parse_llm_json(content)
@@ -1,10 +1,34 @@
 import cv2
 import os
 import re
-from paddleocr import PaddleOCR
+import time
+from contextlib import contextmanager
+from paddleocr import PaddleOCR, TextDetection, TextRecognition
 from difflib import SequenceMatcher
 
 
+# 与 PaddleOCR 默认 pipeline（run_ocr 整帧模式）一致的检测/识别模型。
+# 检测换成 PP-OCRv5_mobile_det 可明显降低耗时，但小字召回会下降
+DEFAULT_DET_MODEL = "PP-OCRv5_server_det"
+DEFAULT_REC_MODEL = "PP-OCRv5_server_rec"
+
+# 整帧模式在缩放后的图上识别，宽度需保证小字可读；
+# 多分辨率模式与文字密度探测只在小图上找文本框，识别另从原图裁剪，可用更小的宽度（各分析模式的 det_max_width）。
+# 不同宽度下的召回与耗时用 bench_ocr.py 在实际视频上测量
+FULL_DET_MAX_WIDTH = 540
+MULTIRES_DET_MAX_WIDTH = 384
+
+
+#阶段计时：with stage_timer(timings, "ocr"): ...
+@contextmanager
+def stage_timer(timings, stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = round(timings.get(stage, 0.0) + time.perf_counter() - start, 4)
+
+
 ##每秒抽一次帧
 def extract_frames(video_path, output_dir, interval_sec):
     os.makedirs(output_dir, exist_ok=True)
@@ -47,14 +71,55 @@ def resize_frame(frame, max_width=800):
         return cv2.resize(frame, (new_w, new_h))
     return frame
 
-def run_ocr(frames):
+class OCREngines:
+    """
+    预加载的 OCR 模型，供常驻服务跨请求复用，避免每次分析重新加载。
+    Paddle 推理对象非线程安全，每个工作线程应持有独立的一份。
+    detector 同时用于文字密度探测与多分辨率 OCR。
+    """
+
+    def __init__(self, det_model=DEFAULT_DET_MODEL, rec_model=DEFAULT_REC_MODEL):
+        self.detector = TextDetection(model_name=det_model)
+        self.recognizer = TextRecognition(model_name=rec_model)
+        self._ocr = None
+
+    @property
+    def ocr(self):
+        # 整帧模式的完整 pipeline 按需加载
+        if self._ocr is None:
+            self._ocr = PaddleOCR(
+                use_doc_orientation_classify=False,
+                use_doc_unwarping=False,
+                use_textline_orientation=False)
+        return self._ocr
+
+def run_ocr(frames, mode="full", det_max_width=None, engines=None):
+    """
+    mode="full":     整帧缩放到 det_max_width（默认 FULL_DET_MAX_WIDTH）后检测+识别（原有方式）
+    mode="multires": 缩放到 det_max_width（默认 MULTIRES_DET_MAX_WIDTH）的小图检测，原图裁剪识别，见 run_ocr_multires
+    engines:         可选的 OCREngines，不传则每次新建模型
+    """
+    if mode == "multires":
+        return run_ocr_multires(
+            frames,
+            det_max_width=det_max_width or MULTIRES_DET_MAX_WIDTH,
+            detector=engines.detector if engines else None,
+            recognizer=engines.recognizer if engines else None
+        )
+    if mode != "full":
+        raise ValueError(f"不支持的 OCR 模式: {mode}。可选值: ['full', 'multires']")
+    det_max_width = det_max_width or FULL_DET_MAX_WIDTH
+
     ocr_results = []
     # ocr = TextRecognition()
 
-    ocr = PaddleOCR(
-    use_doc_orientation_classify=False, 
-    use_doc_unwarping=False, 
-    use_textline_orientation=False) # 文本检测+文本识别
+    if engines is not None:
+        ocr = engines.ocr
+    else:
+        ocr = PaddleOCR(
+        use_doc_orientation_classify=False, 
+        use_doc_unwarping=False, 
+        use_textline_orientation=False) # 文本检测+文本识别
 
     # for frame in frames:
     #     resized_frame = resize_frame(frame, max_width=720)
@@ -64,7 +129,7 @@ def run_ocr(frames):
         image = cv2.imread(frame_info["image_path"])
         if image is None:
             continue
-        resized = resize_frame(image, max_width=540)
+        resized = resize_frame(image, max_width=det_max_width)
         result = ocr.predict(resized)  # ← 传图像
 
         blocks = []
@@ -97,14 +162,189 @@ def run_ocr(frames):
                     ]
                 })
 
-                ocr_results.append({
-                    "frame_id": frame_info["frame_id"],
-                    "timestamp": frame_info["timestamp"],
-                    "ocr_blocks": blocks
+        # 每帧一条记录
+        ocr_results.append({
+            "frame_id": frame_info["frame_id"],
+            "timestamp": frame_info["timestamp"],
+            "ocr_blocks": blocks
+        })
+
+    return ocr_results
+
+#多分辨率 OCR：低分辨率检测 + 原分辨率裁剪识别
+def crop_text_region(image, bbox, pad=4, rec_max_height=96):
+    """按原图坐标裁剪文本区域；过高的大标题裁剪缩小到 rec_max_height，识别模型本身只需约 48px 高"""
+    h, w = image.shape[:2]
+    x1, y1, x2, y2 = bbox
+    x1, y1 = max(0, x1 - pad), max(0, y1 - pad)
+    x2, y2 = min(w, x2 + pad), min(h, y2 + pad)
+    if x2 <= x1 or y2 <= y1:
+        return None
+
+    crop = image[y1:y2, x1:x2]
+    crop_h, crop_w = crop.shape[:2]
+    if crop_h > rec_max_height:
+        scale = rec_max_height / crop_h
+        crop = cv2.resize(crop, (max(1, int(crop_w * scale)), rec_max_height), interpolation=cv2.INTER_AREA)
+    return crop
+
+def run_ocr_multires(frames, det_max_width=MULTIRES_DET_MAX_WIDTH, detector=None, recognizer=None, rec_batch_size=8):
+    """
+    - 检测：整帧缩放到 det_max_width 的小图上跑文本检测（计算量随分辨率平方下降，384 宽约为 540 宽的一半）
+    - 识别：检测框按缩放比例还原到原图坐标，从原分辨率帧裁剪后识别，小字幕不因缩放丢失
+    检测图只需定位文本框，不必像整帧模式那样保证小字可读；宽度过小时细小字幕的框会漏检。
+    输出格式与 run_ocr 一致，bbox 为原图坐标
+    """
+    if detector is None:
+        detector = TextDetection(model_name=DEFAULT_DET_MODEL)
+    if recognizer is None:
+        recognizer = TextRecognition(model_name=DEFAULT_REC_MODEL)
+
+    ocr_results = []
+    for frame_info in frames:
+        image = cv2.imread(frame_info["image_path"])
+        if image is None:
+            continue
+        resized = resize_frame(image, max_width=det_max_width)
+        scale = image.shape[1] / resized.shape[1]  # 小图 → 原图
+
+        bboxes = []
+        for res in detector.predict(resized):
+            for poly in res["dt_polys"]:
+                x_coords = [p[0] for p in poly]
+                y_coords = [p[1] for p in poly]
+                bboxes.append([
+                    int(min(x_coords) * scale),
+                    int(min(y_coords) * scale),
+                    int(round(max(x_coords) * scale)),
+                    int(round(max(y_coords) * scale))
+                ])
+
+        crops = []
+        crop_bboxes = []
+        for bbox in bboxes:
+            crop = crop_text_region(image, bbox)
+            if crop is not None:
+                crops.append(crop)
+                crop_bboxes.append(bbox)
+
+        blocks = []
+        if crops:
+            rec_results = recognizer.predict(crops, batch_size=rec_batch_size)
+            for bbox, rec in zip(crop_bboxes, rec_results):
+                blocks.append({
+                    "text": rec["rec_text"].strip(),
+                    "confidence": float(rec["rec_score"]),
+                    "bbox": bbox
                 })
 
+        ocr_results.append({
+            "frame_id": frame_info["frame_id"],
+            "timestamp": frame_info["timestamp"],
+            "ocr_blocks": blocks
+        })
+
     return ocr_results
 
+#文字密度探测：全量 OCR 前先在少量均匀分布的帧上只跑文本检测
+def probe_text_density(frames, num_probes=5, min_boxes=1, detector=None, det_max_width=MULTIRES_DET_MAX_WIDTH):
+    """
+    只跑文本检测，检测宽度与多分辨率 OCR 共用（各分析模式的 det_max_width）。
+    返回探测统计:
+    - probed: 实际探测帧数
+    - text_frames: 检测到 >= min_boxes 个文本框的帧数
+    - text_ratio: text_frames / probed
+    - avg_boxes: 平均每帧文本框数
+    """
+    if not frames:
+        return {"probed": 0, "text_frames": 0, "text_ratio": 0.0, "avg_boxes": 0.0}
+
+    if detector is None:
+        detector = TextDetection(model_name=DEFAULT_DET_MODEL)
+
+    # 均匀取帧（含首尾）
+    n = min(num_probes, len(frames))
+    if n == 1:
+        indices = [len(frames) // 2]
+    else:
+        indices = sorted({round(i * (len(frames) - 1) / (n - 1)) for i in range(n)})
+
+    probed = 0
+    text_frames = 0
+    total_boxes = 0
+    for idx in indices:
+        image = cv2.imread(frames[idx]["image_path"])
+        if image is None:
+            continue
+        resized = resize_frame(image, max_width=det_max_width)
+        num_boxes = sum(len(res["dt_polys"]) for res in detector.predict(resized))
+
+        probed += 1
+        total_boxes += num_boxes
+        if num_boxes >= min_boxes:
+            text_frames += 1
+
+    return {
+        "probed": probed,
+        "text_frames": text_frames,
+        "text_ratio": round(text_frames / probed, 3) if probed else 0.0,
+        "avg_boxes": round(total_boxes / probed, 2) if probed else 0.0,
+    }
+
+def plan_ocr_frames(frames, probe, min_text_ratio=0.4, policy="sparse", sparse_step=4):
+    """
+    根据探测结果决定全量 OCR 的帧:
+    - text_ratio >= min_text_ratio: full，照常 OCR 全部抽帧
+    - 否则 policy="sparse": 每 sparse_step 帧取一帧
+    - 否则 policy="skip":   不做 OCR，直接返回“文字不足”结果
+    返回 (待 OCR 帧列表, 决策信息)；决策中的 frame_step 为实际 OCR 帧间隔相对抽帧间隔的倍数，
+    合并文本时 time_gap_merge 需按此放大，否则稀疏帧之间永远无法合并成连续时间段
+    """
+    if policy not in ("sparse", "skip"):
+        raise ValueError(f"不支持的探测策略: {policy}。可选值: ['sparse', 'skip']")
+
+    frame_step = 1
+    if probe["probed"] > 0 and probe["text_ratio"] >= min_text_ratio:
+        action = "full"
+        selected = frames
+    elif policy == "skip":
+        action = "skip"
+        selected = []
+    else:
+        action = "sparse"
+        selected = frames[::sparse_step]
+        frame_step = sparse_step
+
+    decision = {
+        "action": action,
+        "text_ratio": probe["text_ratio"],
+        "avg_boxes": probe["avg_boxes"],
+        "min_text_ratio": min_text_ratio,
+        "frame_step": frame_step,
+        "frames_total": len(frames),
+        "frames_ocr": len(selected),
+        "frames_saved": len(frames) - len(selected),
+        "llm_skipped": action == "skip",
+    }
+    return selected, decision
+
+def build_insufficient_text_result():
+    """
+    画面文字不足时的兜底结果，不调用大模型。
+    低质/风险未经判断，置为 None（落盘为 null），避免被当成“无风险”
+    """
+    return {
+        "summary": "视频画面文字不足，无法基于文字内容进行分析",
+        "summary_confidence": 0.0,
+        "tags": [],
+        "category": "其他",
+        "genre": "其他",
+        "tone": "未知",
+        "sentiment": "中性",
+        "is_low_quality": None,
+        "has_risk": None,
+    }
+
 #OCR 去噪
 def is_valid_text(text):
     # 规则 1：长度 < 2
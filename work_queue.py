@@ -0,0 +1,165 @@
+import os
+import sqlite3
+import time
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    video_path  TEXT NOT NULL,
+    mode        TEXT NOT NULL,
+    status      TEXT NOT NULL DEFAULT 'pending',   -- pending / running / done / failed
+    worker      TEXT,
+    lease_until REAL,
+    attempts    INTEGER NOT NULL DEFAULT 0,
+    error       TEXT,
+    created_at  REAL NOT NULL,
+    updated_at  REAL NOT NULL,
+    UNIQUE (video_path, mode)
+);
+CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks (status, lease_until);
+"""
+
+
+class WorkQueue:
+    """
+    基于 SQLite 的多节点任务队列（数据库文件放在各节点共享的目录下）:
+    - claim: 原子领取一个待处理任务并加租约（lease）
+    - heartbeat: 处理中定期续租
+    - 租约过期（节点崩溃/失联）的任务在下次 claim 时自动回到 pending
+    - fail 只对仍持有租约的 worker 生效；complete 在租约过期、任务尚未被他人领取时也生效
+    """
+
+    def __init__(self, db_path, lease_sec=300, max_attempts=3):
+        if lease_sec <= 0:
+            raise ValueError("lease_sec 必须大于 0")
+        if max_attempts < 1:
+            raise ValueError("max_attempts 必须大于 0")
+
+        self.db_path = db_path
+        self.lease_sec = lease_sec
+        self.max_attempts = max_attempts
+
+        db_dir = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(db_dir, exist_ok=True)
+        # 手动管理事务；多进程争用写锁时最多等待 30 秒
+        self._conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.executescript(SCHEMA)
+
+    def _write_txn(self, fn):
+        """BEGIN IMMEDIATE 立即拿写锁，保证领取/续租等“读后写”操作的原子性"""
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = fn(self._conn)
+            self._conn.execute("COMMIT")
+            return result
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+
+    def enqueue(self, video_paths, mode):
+        """批量入队，相同 (video_path, mode) 不重复入队，返回新增任务数"""
+        now = time.time()
+        rows = [(os.path.abspath(p), mode, now, now) for p in video_paths]
+
+        def txn(conn):
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO tasks (video_path, mode, created_at, updated_at) VALUES (?, ?, ?, ?)",
+                rows
+            )
+            return conn.total_changes - before
+
+        return self._write_txn(txn)
+
+    def claim(self, worker_id):
+        """领取一个任务，返回 dict；当前无可领取任务时返回 None"""
+        def txn(conn):
+            now = time.time()
+            self._requeue_expired(conn, now)
+            row = conn.execute(
+                "SELECT * FROM tasks WHERE status = 'pending' ORDER BY id LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE tasks SET status = 'running', worker = ?, lease_until = ?, "
+                "attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                (worker_id, now + self.lease_sec, now, row["id"])
+            )
+            task = dict(row)
+            task.update(status="running", worker=worker_id, attempts=row["attempts"] + 1)
+            return task
+
+        return self._write_txn(txn)
+
+    def _requeue_expired(self, conn, now):
+        # 超过最大尝试次数的过期任务标记失败，其余回到 pending
+        conn.execute(
+            "UPDATE tasks SET status = 'failed', worker = NULL, lease_until = NULL, "
+            "error = '租约过期次数超过上限', updated_at = ? "
+            "WHERE status = 'running' AND lease_until < ? AND attempts >= ?",
+            (now, now, self.max_attempts)
+        )
+        conn.execute(
+            "UPDATE tasks SET status = 'pending', worker = NULL, lease_until = NULL, updated_at = ? "
+            "WHERE status = 'running' AND lease_until < ?",
+            (now, now)
+        )
+
+    def heartbeat(self, task_id, worker_id):
+        """续租；返回 False 表示租约已丢失（已过期并被回收或被他人领取）"""
+        def txn(conn):
+            now = time.time()
+            cur = conn.execute(
+                "UPDATE tasks SET lease_until = ?, updated_at = ? "
+                "WHERE id = ? AND worker = ? AND status = 'running'",
+                (now + self.lease_sec, now, task_id, worker_id)
+            )
+            return cur.rowcount == 1
+
+        return self._write_txn(txn)
+
+    def complete(self, task_id, worker_id):
+        """
+        提交完成；返回 False 表示任务已被其他 worker 领取，由持有者负责提交。
+        租约过期后已回到 pending（或超过次数被标记 failed）的任务结果仍然有效，照常标记 done
+        """
+        def txn(conn):
+            cur = conn.execute(
+                "UPDATE tasks SET status = 'done', worker = ?, lease_until = NULL, error = NULL, updated_at = ? "
+                "WHERE id = ? AND ((worker = ? AND status = 'running') OR status IN ('pending', 'failed'))",
+                (worker_id, time.time(), task_id, worker_id)
+            )
+            return cur.rowcount == 1
+
+        return self._write_txn(txn)
+
+    def fail(self, task_id, worker_id, error):
+        """处理失败：未达最大尝试次数则重新排队，否则标记 failed"""
+        def txn(conn):
+            cur = conn.execute(
+                "UPDATE tasks SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                "worker = NULL, lease_until = NULL, error = ?, updated_at = ? "
+                "WHERE id = ? AND worker = ? AND status = 'running'",
+                (self.max_attempts, str(error)[:1000], time.time(), task_id, worker_id)
+            )
+            return cur.rowcount == 1
+
+        return self._write_txn(txn)
+
+    def stats(self):
+        """各状态任务数"""
+        counts = {"pending": 0, "running": 0, "done": 0, "failed": 0}
+        for row in self._conn.execute("SELECT status, COUNT(*) AS n FROM tasks GROUP BY status"):
+            counts[row["status"]] = row["n"]
+        return counts
+
+    def failed_tasks(self):
+        return [dict(row) for row in self._conn.execute(
+            "SELECT id, video_path, mode, attempts, error FROM tasks WHERE status = 'failed' ORDER BY id"
+        )]
+
+    def close(self):
+        self._conn.close()